@@ -5,8 +5,9 @@ from pathlib import Path
 
 import typer
 
-from arnold.decks import load_decks
-from arnold.state import StateFileError, StateStore
+from arnold.decks import legacy_card_keys, load_decks
+from arnold.scheduler import unix_now
+from arnold.state import StateFileError, StateStore, StateWriter
 from arnold.web import create_app
 
 
@@ -59,7 +60,15 @@ def main(
         typer.echo(str(e), err=True)
         raise typer.Exit(code=1)
 
-    flask_app = create_app(decks=loaded_decks, state_store=state_store)
+    if state_store.has_legacy_keys() and state_store.rename_keys(
+        legacy_card_keys(loaded_decks)
+    ):
+        state_store.save(now=unix_now())
+
+    state_writer = StateWriter(state_store)
+    flask_app = create_app(
+        decks=loaded_decks, state_store=state_store, state_writer=state_writer
+    )
 
     url = f"http://{host}:{port}/"
     typer.echo(url)
@@ -67,7 +76,10 @@ def main(
     if not no_browser:
         webbrowser.open(url)
 
-    flask_app.run(host=host, port=port, debug=debug, use_reloader=False)
+    try:
+        flask_app.run(host=host, port=port, debug=debug, use_reloader=False)
+    finally:
+        state_writer.close(now=unix_now())
 
 
 def entrypoint() -> None:
@@ -1,13 +1,28 @@
 from __future__ import annotations
 
+import functools
 import hashlib
 import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable
 
 from arnold.models import Card, Deck
 
+try:
+    import simdjson  # pyright: ignore[reportMissingImports]
+except ImportError:  # pragma: no cover - optional speedup (`pip install arnold[fast]`)
+    simdjson = None
+
+_MAX_LOAD_WORKERS = 8
+_STR_ONLY = frozenset((str,))
+# `dict.get` defaults, so each card field is looked up exactly once.
+_MISSING: Any = object()
+_NO_TAGS: tuple[str, ...] = ()
+
 
 @dataclass(frozen=True, slots=True)
 class DeckValidationError(Exception):
@@ -20,25 +35,113 @@ class DeckValidationError(Exception):
         return "\n".join(lines)
 
 
+@functools.lru_cache(maxsize=256)
 def compute_deck_id(resolved_path: Path) -> str:
     """Return a stable deck ID derived from the resolved deck path.
 
     This is used as a namespace prefix for state keys so two different files can
     contain identical cards without colliding.
     """
-    digest = hashlib.sha1(str(resolved_path).encode("utf-8")).hexdigest()
-    return digest[:12]
+    return hashlib.blake2b(str(resolved_path).encode("utf-8"), digest_size=6).hexdigest()
 
 
 def _content_hashed_card_id(front: str, back: str, tags: tuple[str, ...]) -> str:
-    """Return the canonical card ID: sha1 of (front, back, tags).
+    """Return the canonical card ID: 64-bit blake2b of (front, back, tags).
+
+    Fields are fed to the hash as length-prefixed UTF-8 (`b"<len>:<bytes>"`), which
+    keeps field boundaries unambiguous without encoding an intermediate JSON object.
 
     `tags` must already be normalized (sorted/deduped) so tag ordering does not
     affect identity.
     """
-    payload = {"back": back, "front": front, "tags": list(tags)}
+    h = hashlib.blake2b(digest_size=8)
+    for field in (front, back, *tags):
+        data = field.encode("utf-8")
+        h.update(b"%d:" % len(data))
+        h.update(data)
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=256)
+def _legacy_deck_id(resolved_path: Path) -> str:
+    return hashlib.sha1(str(resolved_path).encode("utf-8")).hexdigest()[:12]
+
+
+def _legacy_card_key(card: Card) -> str:
+    """Return the state key older versions used for `card` (sha1 deck + card IDs)."""
+    deck_id = _legacy_deck_id(card.deck_path)
+    payload = {"back": card.back, "front": card.front, "tags": list(card.tags)}
     raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
-    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    return f"{deck_id}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+
+def legacy_card_keys(decks: Iterable[Deck]) -> dict[str, str]:
+    """Map legacy (sha1-based) state keys to the current key for every card.
+
+    Used to migrate progress saved by older versions; see `StateStore.rename_keys`.
+    """
+    return {_legacy_card_key(card): card.key for deck in decks for card in deck.cards}
+
+
+class _DeckReader(threading.local):
+    """Per-thread simdjson parser + read buffer, reused across deck loads.
+
+    Constructing a parser (and its internal buffers) per file is a measurable share
+    of small-deck load time, and a parser instance is not safe to share across
+    threads. The read buffer grows to the largest deck seen on this thread.
+    """
+
+    def __init__(self) -> None:
+        self.parser = simdjson.Parser() if simdjson is not None else None
+        self.buf = bytearray()
+
+    def read(self, path: Path) -> bytes | memoryview:
+        """Return the file contents (a view into the shared buffer with simdjson)."""
+        if self.parser is None:
+            return path.read_bytes()
+
+        # Unbuffered: we read the whole file into our own buffer, so an io.BufferedReader
+        # layer would only add a copy and its own allocation.
+        with path.open("rb", buffering=0) as f:
+            # One spare byte lets us notice a file that grew since `stat`.
+            size = os.fstat(f.fileno()).st_size + 1
+            if len(self.buf) < size:
+                self.buf = bytearray(size)
+            view = memoryview(self.buf)[:size]
+            n = 0
+            while n < size:
+                chunk = f.readinto(view[n:])
+                if not chunk:
+                    break
+                n += chunk
+            if n == size:
+                return view.tobytes() + f.readall()
+        return view[:n]
+
+    def parse(self, path: Path, data: bytes | memoryview) -> Any:
+        """Parse deck JSON, using simdjson when it is installed.
+
+        simdjson errors carry no position, so on failure we re-parse with the stdlib
+        decoder: it either reports line/col or accepts input simdjson is stricter
+        about (syntax errors are `ValueError`; integers over 64 bits and very deep
+        nesting are `RuntimeError`).
+        """
+        if self.parser is not None:
+            try:
+                return self.parser.parse(data, recursive=True)
+            except (ValueError, RuntimeError):
+                pass
+
+        try:
+            return json.loads(bytes(data))
+        except json.JSONDecodeError as e:
+            msg = f"Invalid JSON: {e.msg} (line {e.lineno}, col {e.colno})"
+            raise DeckValidationError(path=path, errors=(msg,))
+        except UnicodeDecodeError as e:
+            raise DeckValidationError(path=path, errors=(f"Invalid UTF-8: {e}",))
+
+
+_READER = _DeckReader()
 
 
 def load_deck(path: Path, *, deck_index: int) -> Deck:
@@ -56,15 +159,11 @@ def load_deck(path: Path, *, deck_index: int) -> Deck:
     errors: list[str] = []
 
     try:
-        text = path.read_text(encoding="utf-8")
+        raw_bytes = _READER.read(path)
     except OSError as e:
         raise DeckValidationError(path=path, errors=(f"Could not read file: {e}",))
 
-    try:
-        data = json.loads(text)
-    except json.JSONDecodeError as e:
-        msg = f"Invalid JSON: {e.msg} (line {e.lineno}, col {e.colno})"
-        raise DeckValidationError(path=path, errors=(msg,))
+    data = _READER.parse(path, raw_bytes)
 
     deck_name: str | None = None
     cards_raw: Any = None
@@ -103,30 +202,33 @@ def load_deck(path: Path, *, deck_index: int) -> Deck:
             errors.append(f"Card {card_index}: must be an object.")
             continue
 
-        front = raw.get("front")
-        back = raw.get("back")
+        front = raw.get("front", _MISSING)
+        back = raw.get("back", _MISSING)
+        tags_raw = raw.get("tags", _NO_TAGS)
 
         if "id" in raw:
             errors.append(
                 f"Card {card_index}: field 'id' is deprecated and not allowed; remove it."
             )
 
-        if "front" not in raw:
+        if front is _MISSING:
             errors.append(f"Card {card_index}: missing required field 'front'.")
         elif not isinstance(front, str):
             errors.append(f"Card {card_index}: field 'front' must be a string.")
 
-        if "back" not in raw:
+        if back is _MISSING:
             errors.append(f"Card {card_index}: missing required field 'back'.")
         elif not isinstance(back, str):
             errors.append(f"Card {card_index}: field 'back' must be a string.")
 
-        tags_raw = raw.get("tags", [])
-        tags: tuple[str, ...] = ()
-        if tags_raw == []:
-            tags = ()
-        elif isinstance(tags_raw, list) and all(isinstance(t, str) for t in tags_raw):
-            tags = tuple(sorted(set(tags_raw)))
+        tags = _NO_TAGS
+        # `set(map(type, ...))` checks element types in one C-level pass; exact type
+        # checks are fine because JSON decoders never produce list/str subclasses.
+        if tags_raw is _NO_TAGS:
+            pass
+        elif type(tags_raw) is list and set(map(type, tags_raw)) <= _STR_ONLY:
+            if tags_raw:
+                tags = tuple(sorted(set(tags_raw)))
         else:
             errors.append(
                 f"Card {card_index}: field 'tags' must be a list of strings when provided."
@@ -151,7 +253,7 @@ def load_deck(path: Path, *, deck_index: int) -> Deck:
                     tags=tags,
                     deck_name=deck_name,
                     deck_path=resolved_path,
-                    order=(deck_index, card_index),
+                    order=(deck_index << 32) | card_index,
                 )
             )
 
@@ -161,13 +263,32 @@ def load_deck(path: Path, *, deck_index: int) -> Deck:
     return Deck(path=path, deck_id=deck_id, name=deck_name, cards=tuple(cards))
 
 
+def _load_deck_or_error(path: Path, deck_index: int) -> Deck | DeckValidationError:
+    try:
+        return load_deck(path, deck_index=deck_index)
+    except DeckValidationError as e:
+        return e
+
+
 def load_decks(paths: list[Path]) -> tuple[list[Deck], list[DeckValidationError]]:
-    """Load many decks, collecting per-file validation failures."""
+    """Load many decks, collecting per-file validation failures.
+
+    Files are loaded on a small thread pool (reads release the GIL); results keep
+    the input order.
+    """
+    results: list[Deck | DeckValidationError]
+    if len(paths) <= 1:
+        results = [_load_deck_or_error(path, idx) for idx, path in enumerate(paths)]
+    else:
+        workers = min(_MAX_LOAD_WORKERS, len(paths))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_load_deck_or_error, paths, range(len(paths))))
+
     decks: list[Deck] = []
     failures: list[DeckValidationError] = []
-    for idx, path in enumerate(paths):
-        try:
-            decks.append(load_deck(path, deck_index=idx))
-        except DeckValidationError as e:
-            failures.append(e)
+    for result in results:
+        if isinstance(result, DeckValidationError):
+            failures.append(result)
+        else:
+            decks.append(result)
     return decks, failures
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import sys
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Literal
 
@@ -16,11 +17,15 @@ class Card:
     tags: tuple[str, ...]
     deck_name: str
     deck_path: Path
-    order: tuple[int, int]
-
-    @property
-    def key(self) -> str:
-        return f"{self.deck_id}:{self.card_id}"
+    # Study order packed as `(deck_index << 32) | card_index`: one int compare
+    # instead of a tuple comparison.
+    order: int
+    # `"<deck_id>:<card_id>"`, built once here since it's read on every lookup.
+    # Interned, like the keys `StateStore` loads, so state lookups match by identity.
+    key: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "key", sys.intern(f"{self.deck_id}:{self.card_id}"))
 
 
 @dataclass(frozen=True, slots=True)
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import heapq
 import time
-from typing import Iterable
+from array import array
+from typing import Callable, Iterable, Mapping
 
-from arnold.models import Card, CardState, Deck, Rating, Selection
+from arnold.models import Card, CardState, Rating, Selection
 
 DEFAULT_EASE = 2.5
 MIN_EASE = 1.3
@@ -21,93 +23,268 @@ def default_state(*, now: int) -> CardState:
     )
 
 
-def apply_rating(*, existing: CardState | None, rating: Rating, now: int) -> CardState:
-    """Apply a rating to the existing state and return the next state."""
-    state = existing if existing is not None else default_state(now=now)
+def _due_after(interval_days: float, *, now: int) -> int:
+    return now + int(round(interval_days * 86_400))
 
-    ease = state.ease_factor
-    reps = state.repetitions
-    interval = state.interval_days
-
-    if rating == "again":
-        ease = max(MIN_EASE, ease - 0.2)
-        reps = 0
-        interval = 0.0
-        due = now + 60
-    elif rating == "hard":
-        ease = max(MIN_EASE, ease - 0.15)
-        reps = reps + 1
-        if reps == 1:
-            interval = 1.0
-        elif reps == 2:
-            interval = 3.0
-        else:
-            interval = max(1.0, interval * 1.2)
-        due = now + int(round(interval * 86_400))
-    elif rating == "good":
-        reps = reps + 1
-        if reps == 1:
-            interval = 1.0
-        elif reps == 2:
-            interval = 6.0
-        else:
-            interval = max(1.0, interval * ease)
-        due = now + int(round(interval * 86_400))
-    elif rating == "easy":
-        ease = ease + 0.15
-        reps = reps + 1
-        if reps == 1:
-            interval = 2.0
-        elif reps == 2:
-            interval = 7.0
-        else:
-            interval = max(1.0, interval * ease * 1.3)
-        due = now + int(round(interval * 86_400))
-    else:  # pragma: no cover
-        raise ValueError(f"Unknown rating: {rating}")
 
+def _rate_again(state: CardState, now: int) -> CardState:
+    return CardState(
+        due=now + 60,
+        interval_days=0.0,
+        ease_factor=max(MIN_EASE, state.ease_factor - 0.2),
+        repetitions=0,
+    )
+
+
+def _rate_hard(state: CardState, now: int) -> CardState:
+    reps = state.repetitions + 1
+    if reps == 1:
+        interval = 1.0
+    elif reps == 2:
+        interval = 3.0
+    else:
+        interval = max(1.0, state.interval_days * 1.2)
     return CardState(
-        due=due, interval_days=interval, ease_factor=ease, repetitions=reps
+        due=_due_after(interval, now=now),
+        interval_days=interval,
+        ease_factor=max(MIN_EASE, state.ease_factor - 0.15),
+        repetitions=reps,
     )
 
 
+def _rate_good(state: CardState, now: int) -> CardState:
+    reps = state.repetitions + 1
+    if reps == 1:
+        interval = 1.0
+    elif reps == 2:
+        interval = 6.0
+    else:
+        interval = max(1.0, state.interval_days * state.ease_factor)
+    return CardState(
+        due=_due_after(interval, now=now),
+        interval_days=interval,
+        ease_factor=state.ease_factor,
+        repetitions=reps,
+    )
+
+
+def _rate_easy(state: CardState, now: int) -> CardState:
+    ease = state.ease_factor + 0.15
+    reps = state.repetitions + 1
+    if reps == 1:
+        interval = 2.0
+    elif reps == 2:
+        interval = 7.0
+    else:
+        interval = max(1.0, state.interval_days * ease * 1.3)
+    return CardState(
+        due=_due_after(interval, now=now),
+        interval_days=interval,
+        ease_factor=ease,
+        repetitions=reps,
+    )
+
+
+_RATING_RULES: dict[Rating, Callable[[CardState, int], CardState]] = {
+    "again": _rate_again,
+    "hard": _rate_hard,
+    "good": _rate_good,
+    "easy": _rate_easy,
+}
+
+
+def apply_rating(*, existing: CardState | None, rating: Rating, now: int) -> CardState:
+    """Apply a rating to the existing state and return the next state."""
+    state = existing if existing is not None else default_state(now=now)
+    try:
+        rule = _RATING_RULES[rating]
+    except KeyError:  # pragma: no cover
+        raise ValueError(f"Unknown rating: {rating}") from None
+    return rule(state, now)
+
+
 def select_next(
-    *, decks: Iterable[Deck], state: dict[str, CardState], now: int
+    *, cards: Iterable[Card], state: Mapping[str, CardState], now: int
 ) -> Selection:
-    """Pick the next card to study, preferring due cards over new cards."""
-    all_cards = [card for deck in decks for card in deck.cards]
+    """Pick the next card to study, preferring due cards over new cards.
+
+    `cards` is the flat, prebuilt sequence of every loaded card (e.g.
+    `AppConfig.cards`), so callers don't rebuild it per request.
 
-    due_candidates: list[tuple[int, tuple[int, int], Card]] = []
-    new_candidates: list[Card] = []
-    future_dues: list[int] = []
+    Due cards are ordered by `(due, order)` and new cards by `order`. This is a
+    single pass that tracks running minimums rather than collecting and sorting
+    candidate lists.
+    """
+    best_due: Card | None = None
+    best_due_ts = 0
+    best_new: Card | None = None
+    due_count = 0
+    new_count = 0
+    total_count = 0
+    min_future_due: int | None = None
 
-    for card in all_cards:
+    for card in cards:
+        total_count += 1
         st = state.get(card.key)
         if st is None:
-            new_candidates.append(card)
+            new_count += 1
+            if best_new is None or card.order < best_new.order:
+                best_new = card
             continue
 
-        if st.due <= now:
-            due_candidates.append((st.due, card.order, card))
-        else:
-            future_dues.append(st.due)
-
-    due_candidates.sort(key=lambda t: (t[0], t[1]))
-    new_candidates.sort(key=lambda c: c.order)
+        due = st.due
+        if due <= now:
+            due_count += 1
+            if (
+                best_due is None
+                or due < best_due_ts
+                or (due == best_due_ts and card.order < best_due.order)
+            ):
+                best_due = card
+                best_due_ts = due
+        elif min_future_due is None or due < min_future_due:
+            min_future_due = due
 
-    chosen: Card | None
-    if due_candidates:
-        chosen = due_candidates[0][2]
-    elif new_candidates:
-        chosen = new_candidates[0]
-    else:
-        chosen = None
-
-    next_due = min(future_dues) if chosen is None and future_dues else None
+    chosen = best_due if best_due is not None else best_new
+    next_due = min_future_due if chosen is None else None
     return Selection(
         card=chosen,
-        due_count=len(due_candidates),
-        new_count=len(new_candidates),
-        total_count=len(all_cards),
+        due_count=due_count,
+        new_count=new_count,
+        total_count=total_count,
         next_due=next_due,
     )
+
+
+class StudyQueue:
+    """Incremental index answering `select_next` without scanning every card.
+
+    Each distinct card gets a slot number; per-card bookkeeping lives in dense
+    columns indexed by slot (new flag, generation counter) rather than in a dict
+    of per-card tuples. Cards with state sit in a min-heap of
+    `(due, order, slot, generation)`; new cards in a min-heap of
+    `(order, slot, generation)`. `update` bumps the card's generation and pushes a
+    fresh entry, so superseded entries are recognised and skipped lazily. Heaps are
+    rebuilt once stale entries outnumber live ones.
+
+    Not thread-safe: callers must serialize `select` and `update`.
+    """
+
+    def __init__(self, *, cards: Iterable[Card], state: Mapping[str, CardState]) -> None:
+        self._cards: list[Card] = []
+        self._slots: dict[str, int] = {}
+        self._due_heap: list[tuple[int, int, int, int]] = []
+        self._new_heap: list[tuple[int, int, int]] = []
+        self._stale = 0
+
+        is_new = bytearray()
+        for card in cards:
+            if card.key in self._slots:
+                continue
+            slot = len(self._cards)
+            self._slots[card.key] = slot
+            self._cards.append(card)
+            st = state.get(card.key)
+            if st is None:
+                is_new.append(1)
+                self._new_heap.append((card.order, slot, 0))
+            else:
+                is_new.append(0)
+                self._due_heap.append((st.due, card.order, slot, 0))
+
+        self._is_new = is_new
+        self._gen = array("Q", [0]) * len(self._cards)
+        self._new_count = is_new.count(1)
+
+        heapq.heapify(self._due_heap)
+        heapq.heapify(self._new_heap)
+
+    def update(self, key: str, state: CardState | None) -> None:
+        """Record that `key` now has `state` (None means the card is new again)."""
+        slot = self._slots.get(key)
+        if slot is None:
+            return
+
+        self._new_count -= self._is_new[slot]
+        self._stale += 1
+        gen = self._gen[slot] + 1
+        self._gen[slot] = gen
+
+        order = self._cards[slot].order
+        if state is None:
+            self._is_new[slot] = 1
+            self._new_count += 1
+            heapq.heappush(self._new_heap, (order, slot, gen))
+        else:
+            self._is_new[slot] = 0
+            heapq.heappush(self._due_heap, (state.due, order, slot, gen))
+
+        if self._stale > len(self._cards):
+            self._compact()
+
+    def _compact(self) -> None:
+        gens = self._gen
+        self._due_heap = [e for e in self._due_heap if gens[e[2]] == e[3]]
+        self._new_heap = [e for e in self._new_heap if gens[e[1]] == e[2]]
+        heapq.heapify(self._due_heap)
+        heapq.heapify(self._new_heap)
+        self._stale = 0
+
+    def _peek_due(self) -> tuple[int, int, int, int] | None:
+        heap = self._due_heap
+        gens = self._gen
+        while heap and gens[heap[0][2]] != heap[0][3]:
+            heapq.heappop(heap)
+            self._stale -= 1
+        return heap[0] if heap else None
+
+    def _peek_new(self) -> tuple[int, int, int] | None:
+        heap = self._new_heap
+        gens = self._gen
+        while heap and gens[heap[0][1]] != heap[0][2]:
+            heapq.heappop(heap)
+            self._stale -= 1
+        return heap[0] if heap else None
+
+    def _count_due(self, now: int) -> int:
+        """Count live entries with `due <= now`, visiting only that part of the heap."""
+        heap = self._due_heap
+        gens = self._gen
+        size = len(heap)
+        count = 0
+        stack = [0] if heap else []
+        while stack:
+            i = stack.pop()
+            entry = heap[i]
+            if entry[0] > now:
+                continue
+            if gens[entry[2]] == entry[3]:
+                count += 1
+            child = 2 * i + 1
+            if child < size:
+                stack.append(child)
+            if child + 1 < size:
+                stack.append(child + 1)
+        return count
+
+    def select(self, *, now: int) -> Selection:
+        """Return the same selection `select_next` would for the current state."""
+        top_due = self._peek_due()
+        chosen: Card | None = None
+        due_count = 0
+        if top_due is not None and top_due[0] <= now:
+            chosen = self._cards[top_due[2]]
+            due_count = self._count_due(now)
+        else:
+            top_new = self._peek_new()
+            if top_new is not None:
+                chosen = self._cards[top_new[1]]
+
+        next_due = top_due[0] if chosen is None and top_due is not None else None
+        return Selection(
+            card=chosen,
+            due_count=due_count,
+            new_count=self._new_count,
+            total_count=len(self._cards),
+            next_due=next_due,
+        )
@@ -1,13 +1,70 @@
 from __future__ import annotations
 
+import atexit
 import json
+import logging
 import os
+import queue
+import sys
+import threading
+import time
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any
+from typing import Any, Mapping
 
 from arnold.models import CardState
 
+try:
+    import orjson  # pyright: ignore[reportMissingImports]
+except ImportError:  # pragma: no cover - optional speedup (`pip install arnold[fast]`)
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 2
+
+# Card IDs used to be full sha1 hex digests; current IDs are 16-hex blake2b.
+_LEGACY_CARD_ID_LEN = 40
+
+# One logged change: (card key, new state or None if cleared, unix time).
+_Change = tuple[str, CardState | None, int]
+
+# Write a full snapshot (and truncate the log) after this many logged changes.
+DEFAULT_CHECKPOINT_EVERY = 50
+
+# How long the background writer keeps collecting changes before one fsync.
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+def _loads(data: bytes) -> Any:
+    """Decode JSON bytes; both backends raise `json.JSONDecodeError` subclasses."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps_snapshot(payload: dict[str, Any]) -> bytes:
+    """Encode the snapshot as indented, key-sorted JSON plus a trailing newline."""
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+        return orjson.dumps(payload, option=option) + b"\n"
+    return (json.dumps(payload, indent=2, sort_keys=True) + "\n").encode("utf-8")
+
+
+def _dumps_line(record: dict[str, Any]) -> bytes:
+    """Encode one compact log line."""
+    if orjson is not None:
+        return orjson.dumps(record) + b"\n"
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _apply(cards: dict[str, CardState], key: str, state: CardState | None) -> None:
+    """Set or clear `key` in place (callers own a fresh copy of `cards`)."""
+    if state is None:
+        cards.pop(key, None)
+    else:
+        cards[key] = state
+
 
 @dataclass(frozen=True, slots=True)
 class StateFileError(Exception):
@@ -20,8 +77,29 @@ class StateFileError(Exception):
 
 @dataclass(slots=True)
 class StateStore:
+    """Card progress: a JSON snapshot plus an append-only change log.
+
+    `commit` appends one line per change to `<state file>.wal` (cheap, O(1)) and
+    only rewrites the full snapshot every `checkpoint_every` changes. `load` reads
+    the snapshot and then replays the log on top of it.
+
+    `set`/`update`/`rename_keys` are copy-on-write: they build new dicts and rebind
+    `cards`, so a reader holding a reference to `cards` sees a consistent mapping
+    without taking any lock. `save` caches each state's JSON form and reuses it
+    while `cards` still holds that same `CardState` object, so replace states
+    rather than mutating them in place.
+    """
+
     path: Path
     cards: dict[str, CardState] = field(default_factory=dict)
+    checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY
+    _logged: int = field(default=0, init=False, repr=False)
+    # Set when a failed append couldn't be cut back off the log.
+    _log_torn: bool = field(default=False, init=False, repr=False)
+    # Card key -> (state, its JSON form), as of the last `save`.
+    _json: dict[str, tuple[CardState, dict[str, object]]] = field(
+        default_factory=dict, init=False, repr=False
+    )
 
     @classmethod
     def load(cls, path: Path) -> StateStore:
@@ -32,22 +110,28 @@ class StateStore:
         """
         store = cls(path=path)
         store._load_from_disk()
+        store._replay_log()
         return store
 
+    @property
+    def log_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".wal")
+
     def _load_from_disk(self) -> None:
         if not self.path.exists():
             self.cards = {}
+            self._json = {}
             return
 
         try:
-            text = self.path.read_text(encoding="utf-8")
+            data = self.path.read_bytes()
         except OSError as e:
             raise StateFileError(
                 path=self.path, message=f"Could not read state file: {e}"
             )
 
         try:
-            raw = json.loads(text) if text.strip() else {}
+            raw = _loads(data) if data.strip() else {}
         except json.JSONDecodeError as e:
             msg = f"Invalid JSON: {e.msg} (line {e.lineno}, col {e.colno})"
             raise StateFileError(path=self.path, message=msg)
@@ -69,41 +153,268 @@ class StateStore:
                     path=self.path, message="State keys must be strings."
                 )
             try:
-                parsed[key] = CardState.from_json(value)
+                parsed[sys.intern(key)] = CardState.from_json(value)
             except Exception as e:  # noqa: BLE001
                 raise StateFileError(
                     path=self.path, message=f"Invalid state for '{key}': {e}"
                 )
 
         self.cards = parsed
+        self._json = {}
+
+    def _replay_log(self) -> None:
+        """Apply changes logged since the last snapshot.
+
+        A final line that doesn't parse is a torn write from a crash mid-append: it
+        is ignored and cut from the log (so the next append starts on a clean line);
+        anything else that doesn't parse is an error.
+        """
+        try:
+            data = self.log_path.read_bytes()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            raise StateFileError(
+                path=self.log_path, message=f"Could not read state log: {e}"
+            )
+
+        lines = data.splitlines(keepends=True)
+        cards = dict(self.cards)
+        # Bytes of the log made of complete, applied lines.
+        good_len = 0
+        for lineno, line in enumerate(lines, start=1):
+            try:
+                record = _loads(line)
+                key = sys.intern(record["k"])
+                raw_state = record["s"]
+                state = None if raw_state is None else CardState.from_json(raw_state)
+            except Exception as e:  # noqa: BLE001
+                if lineno == len(lines):
+                    break
+                raise StateFileError(
+                    path=self.log_path,
+                    message=f"Invalid log entry (line {lineno}): {e}",
+                )
+            _apply(cards, key, state)
+            self._logged += 1
+            good_len += len(line)
+        self.cards = cards
+
+        if data and (good_len < len(data) or not data.endswith(b"\n")):
+            self._repair_log(data[:good_len])
+
+    def _repair_log(self, good: bytes) -> None:
+        """Cut a torn tail (or finish an unterminated last line) in the log."""
+        try:
+            with self.log_path.open("r+b") as f:
+                f.truncate(len(good))
+                if good and not good.endswith(b"\n"):
+                    f.seek(len(good))
+                    f.write(b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            raise StateFileError(
+                path=self.log_path, message=f"Could not repair state log: {e}"
+            )
 
     def get(self, key: str) -> CardState | None:
         return self.cards.get(key)
 
     def set(self, key: str, state: CardState) -> None:
-        self.cards[key] = state
+        self.update(key, state)
+
+    def update(self, key: str, state: CardState | None) -> None:
+        """Set (or, with None, clear) one card's state in memory only."""
+        cards = dict(self.cards)
+        _apply(cards, key, state)
+        self.cards = cards
+
+    def commit(self, key: str, state: CardState | None, *, now: int) -> None:
+        """Update one card's state and durably log the change (see `append_log`)."""
+        self.update(key, state)
+        self.append_log([(key, state, now)])
+
+    def append_log(self, changes: list[_Change]) -> None:
+        """Append `(key, state, now)` changes to the log with a single fsync.
+
+        Every `checkpoint_every` changes the full snapshot is rewritten via `save`.
+        If the append fails, any partial write is cut off again and the changes
+        still count as unsaved for `checkpoint`. If even that cut fails, the next
+        call rewrites the snapshot (dropping the log) before appending.
+        """
+        if not changes:
+            return
+
+        lines = []
+        for key, state, now in changes:
+            record = {"k": key, "s": None if state is None else state.to_json(), "t": now}
+            lines.append(_dumps_line(record))
+        data = memoryview(b"".join(lines))
+
+        try:
+            if self._log_torn:
+                self.save(now=changes[0][2])
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Unbuffered, so a failed write can't be flushed again on close.
+            with self.log_path.open("ab", buffering=0) as f:
+                start = f.tell()
+                try:
+                    while data:
+                        data = data[f.write(data) :]
+                    os.fsync(f.fileno())
+                except OSError:
+                    self._truncate_log(f, start)
+                    raise
+        except OSError:
+            # The changes are still in memory; count them so `checkpoint` saves them.
+            self._logged += len(changes)
+            raise
+        self._logged += len(changes)
+
+        if self._logged >= self.checkpoint_every:
+            self.save(now=changes[-1][2])
+
+    def _truncate_log(self, f: Any, size: int) -> None:
+        """Cut a failed append back off the log so the next one starts cleanly."""
+        try:
+            f.truncate(size)
+        except OSError:
+            self._log_torn = True
+
+    def checkpoint(self, *, now: int) -> None:
+        """Write a snapshot if there are logged changes not yet in it (e.g. on exit)."""
+        if self._logged:
+            self.save(now=now)
+
+    def has_legacy_keys(self) -> bool:
+        """Return True if any key still uses the legacy (sha1) card ID format."""
+        return any(
+            len(key.partition(":")[2]) == _LEGACY_CARD_ID_LEN for key in self.cards
+        )
+
+    def rename_keys(self, renames: Mapping[str, str]) -> int:
+        """Move state from old keys to new keys, returning how many were moved.
+
+        Keys without a mapping are kept as-is (e.g. cards from decks not loaded in
+        this session). An existing entry under the new key wins over the old one.
+        """
+        cards = dict(self.cards)
+        moved = 0
+        for old_key in [k for k in cards if k in renames]:
+            state = cards.pop(old_key)
+            if renames[old_key] not in cards:
+                _apply(cards, renames[old_key], state)
+            moved += 1
+        self.cards = cards
+        return moved
 
     def save(self, *, now: int) -> None:
         """Persist state to disk using a temp file + replace (atomic-ish)."""
+        # Reuse a card's cached JSON while `cards` still holds the state it was
+        # built from. Checking against `cards` itself (read once: updates rebind it)
+        # also picks up direct edits such as `store.cards[key] = state`.
+        cache = self._json
+        fresh: dict[str, tuple[CardState, dict[str, object]]] = {}
+        for key, state in self.cards.items():
+            entry = cache.get(key)
+            if entry is None or entry[0] is not state:
+                entry = (state, state.to_json())
+            fresh[key] = entry
+        self._json = fresh
+
         payload = {
-            "version": 1,
+            "version": STATE_VERSION,
             "updated_at": now,
-            "cards": {k: v.to_json() for k, v in sorted(self.cards.items())},
+            "cards": {key: entry[1] for key, entry in fresh.items()},
         }
 
         self.path.parent.mkdir(parents=True, exist_ok=True)
         tmp_path = self.path.with_name(self.path.name + ".tmp")
 
         try:
-            with tmp_path.open("w", encoding="utf-8") as f:
-                json.dump(payload, f, indent=2, sort_keys=True)
-                f.write("\n")
+            with tmp_path.open("wb") as f:
+                f.write(_dumps_snapshot(payload))
                 f.flush()
                 os.fsync(f.fileno())
             os.replace(tmp_path, self.path)
+            # The snapshot now includes everything logged so far.
+            self.log_path.unlink(missing_ok=True)
+            self._logged = 0
+            self._log_torn = False
         finally:
             if tmp_path.exists():
                 try:
                     tmp_path.unlink()
                 except OSError:
                     pass
+
+
+class StateWriter:
+    """Moves a `StateStore`'s disk writes off the request path.
+
+    `commit` updates the store in memory and queues the change; a daemon thread
+    appends queued changes to the log in batches (one fsync per batch) and writes
+    snapshots. After the first change of a batch it waits up to `flush_interval`
+    seconds for more, so rapid ratings share a write. `close` drains the queue and
+    checkpoints; it also runs at interpreter exit if nobody called it.
+    """
+
+    def __init__(
+        self, store: StateStore, *, flush_interval: float = DEFAULT_FLUSH_INTERVAL
+    ) -> None:
+        self.store = store
+        self.flush_interval = flush_interval
+        self._queue: queue.SimpleQueue[_Change | None] = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="arnold-state-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self._close_at_exit)
+
+    def commit(self, key: str, state: CardState | None, *, now: int) -> None:
+        """Like `StateStore.commit`, but the log write happens in the background."""
+        self.store.update(key, state)
+        self._queue.put((key, state, now))
+
+    def close(self, *, now: int) -> None:
+        """Flush all queued changes, stop the thread, and checkpoint the snapshot."""
+        atexit.unregister(self._close_at_exit)
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self.store.checkpoint(now=now)
+
+    def _close_at_exit(self) -> None:
+        self.close(now=int(time.time()))
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch: list[_Change] = []
+            stop = item is None
+            if item is not None:
+                batch.append(item)
+            deadline = time.monotonic() + self.flush_interval
+            while not stop:
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout > 0:
+                        item = self._queue.get(timeout=timeout)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            try:
+                self.store.append_log(batch)
+            except Exception:
+                # Progress is still in memory and lands in the next snapshot.
+                logger.exception("Could not write state log %s", self.store.log_path)
+
+            if stop:
+                return
@@ -1,62 +1,122 @@
 from __future__ import annotations
 
+import functools
 import threading
+import time
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Callable, Literal
+from operator import attrgetter
+from types import MappingProxyType
+from typing import Any, Callable, Literal, Mapping, NamedTuple, cast
 
-from flask import Flask, redirect, render_template, request, url_for
+from flask import Flask, g, redirect, request
 
 from arnold.models import Card, CardState, Deck, Rating, Selection
-from arnold.scheduler import apply_rating, select_next, unix_now
-from arnold.state import StateStore
+from arnold.scheduler import StudyQueue, apply_rating, default_state, unix_now
+from arnold.state import StateStore, StateWriter
 
-RATINGS: dict[str, Rating] = {
-    "again": "again",
-    "hard": "hard",
-    "good": "good",
-    "easy": "easy",
-}
+_VALID_RATINGS: frozenset[str] = frozenset(("again", "hard", "good", "easy"))
 
 StudyMode = Literal["study", "history"]
 
+# Path of the `study` view. Redirects join it to `request.script_root` instead of
+# resolving the endpoint with `url_for` on every POST.
+_STUDY_PATH = "/"
+
+# Answered cards kept for back/next/undo; older entries are dropped.
+_MAX_HISTORY = 500
+
+# Every template the study view renders (`study.html` pulls in the other two).
+_TEMPLATES = ("base.html", "study.html", "study_pane.html")
+
 
 def _is_htmx_request() -> bool:
-    """Return True if this request was initiated by htmx (via `HX-Request: true`)."""
-    return request.headers.get("HX-Request") == "true"
+    """Return True if this request was initiated by htmx (via `HX-Request: true`).
+
+    Views and the render helper both ask, so the answer is cached on `flask.g`.
+    The header is read straight from the WSGI environ (`HTTP_HX_REQUEST`),
+    skipping werkzeug's case-insensitive `request.headers` wrapper.
+    """
+    htmx = g.get("htmx")
+    if htmx is None:
+        htmx = g.htmx = request.environ.get("HTTP_HX_REQUEST") == "true"
+    return htmx
+
 
+_MIN = 60
+_HOUR = 60 * _MIN
+_DAY = 24 * _HOUR
 
+
+@functools.lru_cache(maxsize=1024)
 def _format_local_time(ts: int) -> str:
-    """Format a unix timestamp using the server's local timezone."""
-    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %I:%M %p")
+    """Format a unix timestamp using the server's local timezone.
+
+    The same `next_due` is rendered on every request until it changes, so cache it.
+    """
+    return time.strftime("%Y-%m-%d %I:%M %p", time.localtime(ts))
+
+
+def _div_round(n: int, d: int) -> int:
+    """`round(n / d)` (ties to even) in integer arithmetic."""
+    q, r = divmod(n, d)
+    if 2 * r > d or (2 * r == d and q % 2):
+        q += 1
+    return q
 
 
 def _format_sleep_seconds(seconds: int) -> str:
-    """Human-friendly duration label for rating previews."""
+    """Human-friendly duration label for rating previews (integer math only)."""
     seconds = max(0, int(seconds))
     if seconds < 90:
         return "1m"
-    if seconds < 60 * 60:
-        minutes = max(1, int(round(seconds / 60)))
-        return f"{minutes}m"
-    if seconds < 24 * 60 * 60:
-        hours = max(1, int(round(seconds / (60 * 60))))
-        return f"{hours}h"
-    days = seconds / (24 * 60 * 60)
-    rounded = round(days)
-    if abs(days - rounded) >= 0.05 and days < 10:
-        return f"{days:.1f}d".rstrip("0").rstrip(".")
-    return f"{max(1, int(rounded))}d"
-
-
-def _rating_previews(*, existing: CardState | None, now: int) -> dict[Rating, str]:
+    if seconds < _HOUR:
+        return f"{_div_round(seconds, _MIN)}m"
+    if seconds < _DAY:
+        return f"{_div_round(seconds, _HOUR)}h"
+    # Under 10 days, show tenths unless within 0.05d of a whole day. Tenths round
+    # half up, capped at .9 so this branch never prints a whole day.
+    whole, rem = divmod(seconds, _DAY)
+    if seconds < 10 * _DAY and 20 * min(rem, _DAY - rem) >= _DAY:
+        tenth = min(9, (rem * 10 + _DAY // 2) // _DAY)
+        return f"{whole}.{tenth}d"
+    return f"{_div_round(seconds, _DAY)}d"
+
+
+_PREVIEW_RATINGS: tuple[Rating, ...] = ("again", "hard", "good", "easy")
+
+
+@functools.lru_cache(maxsize=4096)
+def _rating_preview_labels(
+    interval_days: float, ease_factor: float, repetitions: int
+) -> Mapping[Rating, str]:
+    """Sleep-time label for each rating.
+
+    `apply_rating` schedules relative to `now` and never reads `due`, so the sleep
+    time depends only on these fields and can be memoized across cards and requests.
+    The mapping itself is cached (read-only), so a hit builds nothing.
+    """
+    state = CardState(
+        due=0,
+        interval_days=interval_days,
+        ease_factor=ease_factor,
+        repetitions=repetitions,
+    )
+    return MappingProxyType(
+        {
+            rating: _format_sleep_seconds(
+                apply_rating(existing=state, rating=rating, now=0).due
+            )
+            for rating in _PREVIEW_RATINGS
+        }
+    )
+
+
+def _rating_previews(*, existing: CardState | None, now: int) -> Mapping[Rating, str]:
     """Compute preview sleep times for each rating button."""
-    previews: dict[Rating, str] = {}
-    ratings: tuple[Rating, ...] = ("again", "hard", "good", "easy")
-    for rating in ratings:
-        next_state = apply_rating(existing=existing, rating=rating, now=now)
-        previews[rating] = _format_sleep_seconds(next_state.due - now)
-    return previews
+    state = existing if existing is not None else default_state(now=now)
+    return _rating_preview_labels(
+        state.interval_days, state.ease_factor, state.repetitions
+    )
 
 
 @dataclass(frozen=True, slots=True)
@@ -76,69 +136,126 @@ class SessionState:
     - 0 => current (normal study flow)
     - 1 => most recently answered card
     - N => Nth most recently answered card
+
+    `history` keeps at most `_MAX_HISTORY` entries (oldest dropped first), so only
+    that many ratings can be undone in one session.
+
+    `state_version` is bumped on every card state change; `selection_cache` holds
+    the last `(state_version, now, selection)` so repeated snapshots skip the queue.
+
+    `snapshot_cache` publishes the last `(now, snapshot)` for lock-free readers.
+    Every write to this object happens under `state_lock` and clears it.
+
+    `idle_pane_cache` holds the last `(snapshot, script_root, html)` rendered for a
+    no-op htmx request. It's checked by value before use, so it's written without
+    the lock; a race only costs a re-render.
     """
 
     done_count: int = 0
     history: list[HistoryEntry] = field(default_factory=list)
     history_cursor: int = 0
+    state_version: int = 0
+    selection_cache: tuple[int, int, Selection] | None = None
+    snapshot_cache: tuple[int, StudySnapshot] | None = None
+    idle_pane_cache: tuple[StudySnapshot, str, str] | None = None
 
 
-@dataclass(frozen=True, slots=True)
-class StudySnapshot:
-    """A consistent snapshot for rendering the study view."""
+class StudySnapshot(NamedTuple):
+    """A consistent snapshot for rendering the study view (built per request)."""
 
     selection: Selection
     done_count: int
     history_cursor: int
     history_len: int
+    # Card key of the history entry at `history_cursor` (None at the live view).
+    history_key: str | None = None
 
 
 @dataclass(frozen=True, slots=True)
 class AppConfig:
-    decks: tuple[Deck, ...]
     state_store: StateStore
     state_lock: threading.Lock
     session: SessionState
     now_fn: Callable[[], int]
-    cards_by_key: dict[str, Card]
+    cards: tuple[Card, ...]
+    key_to_index: Mapping[str, int]
+    queue: StudyQueue
+    state_writer: StateWriter | None
+
+    def card(self, key: str) -> Card | None:
+        """Look up a loaded card by its state key."""
+        idx = self.key_to_index.get(key)
+        return None if idx is None else self.cards[idx]
 
 
 def create_app(
     *,
     decks: list[Deck],
     state_store: StateStore,
+    state_writer: StateWriter | None = None,
     now_fn: Callable[[], int] = unix_now,
 ) -> Flask:
     """Create the Flask app used by `arnold`.
 
     Notes:
     - The app is local-first; progress lives in `state_store`.
+    - With a `state_writer`, disk writes happen on its background thread; without
+      one, each rating is logged synchronously before the response.
     - `now_fn` is injectable for deterministic tests.
     - Session-only features (Done count, history, undo) are stored in memory.
     """
     app = Flask(__name__)
-
-    cards_by_key: dict[str, Card] = {}
+    # Templates ship with the package and don't change while serving: skip the
+    # per-render mtime check and compile them all before the first request.
+    app.config["TEMPLATES_AUTO_RELOAD"] = False
+    app.jinja_env.auto_reload = False
+    for name in _TEMPLATES:
+        app.jinja_env.get_template(name)
+    study_template = app.jinja_env.get_template("study.html")
+    pane_template = app.jinja_env.get_template("study_pane.html")
+
+    # One flat index over every loaded card, shared by lookups and the queue.
+    # Sorted once into study order, so the queue's new-card heap starts out
+    # heap-ordered and `cards` can be scanned without re-sorting.
+    first_seen: dict[str, Card] = {}
     for deck in decks:
         for card in deck.cards:
-            cards_by_key[card.key] = card
+            first_seen.setdefault(card.key, card)
+    cards = sorted(first_seen.values(), key=attrgetter("order"))
+    key_to_index = {card.key: idx for idx, card in enumerate(cards)}
 
     cfg = AppConfig(
-        decks=tuple(decks),
         state_store=state_store,
         state_lock=threading.Lock(),
         session=SessionState(),
         now_fn=now_fn,
-        cards_by_key=cards_by_key,
+        cards=tuple(cards),
+        key_to_index=MappingProxyType(key_to_index),
+        queue=StudyQueue(cards=cards, state=state_store.cards),
+        state_writer=state_writer,
     )
 
+    def _commit(key: str, state: CardState | None, *, now: int) -> None:
+        """Persist one card's new state; call with `state_lock` held."""
+        if cfg.state_writer is not None:
+            cfg.state_writer.commit(key, state, now=now)
+        else:
+            cfg.state_store.commit(key, state, now=now)
+        cfg.queue.update(key, state)
+        cfg.session.state_version += 1
+
     def _reset_history_cursor() -> None:
+        # Usually already 0 (plain study flow); only take the lock to change it.
+        if cfg.session.history_cursor == 0:
+            return
         with cfg.state_lock:
             cfg.session.history_cursor = 0
+            cfg.session.snapshot_cache = None
 
     def _move_history_cursor(delta: int) -> None:
         """Move the session history cursor, clamped to `[0, len(history)]`."""
         with cfg.state_lock:
+            cfg.session.snapshot_cache = None
             history_len = len(cfg.session.history)
             if history_len == 0:
                 cfg.session.history_cursor = 0
@@ -148,40 +265,47 @@ def create_app(
             )
 
     def _snapshot(*, now: int) -> StudySnapshot:
-        """Read a consistent view snapshot (selection + history cursor/len + done)."""
+        """Read a consistent view snapshot (selection + history cursor/len + done).
+
+        Reuses the published snapshot without locking when nothing has changed
+        since it was taken; a concurrent writer just orders this read before it.
+        """
+        published = cfg.session.snapshot_cache
+        if published is not None and published[0] == now:
+            return published[1]
+
         with cfg.state_lock:
             history_len = len(cfg.session.history)
             history_cursor = min(cfg.session.history_cursor, history_len)
             cfg.session.history_cursor = history_cursor
-            selection = select_next(
-                decks=cfg.decks, state=cfg.state_store.cards, now=now
+            version = cfg.session.state_version
+            cached = cfg.session.selection_cache
+            if cached is not None and cached[0] == version and cached[1] == now:
+                selection = cached[2]
+            else:
+                selection = cfg.queue.select(now=now)
+                cfg.session.selection_cache = (version, now, selection)
+            history_key = (
+                cfg.session.history[history_len - history_cursor].card_key
+                if history_cursor > 0
+                else None
             )
-            done_count = cfg.session.done_count
-        return StudySnapshot(
-            selection=selection,
-            done_count=done_count,
-            history_cursor=history_cursor,
-            history_len=history_len,
-        )
-
-    def _history_card_for_cursor(*, history_cursor: int) -> Card | None:
-        """Return the card at `history_cursor`, or None if out of bounds."""
-        if history_cursor <= 0:
-            return None
-        with cfg.state_lock:
-            history_len = len(cfg.session.history)
-            if history_cursor > history_len:
-                return None
-            idx = history_len - history_cursor
-            entry = cfg.session.history[idx]
-        return cfg.cards_by_key.get(entry.card_key)
+            snapshot = StudySnapshot(
+                selection=selection,
+                done_count=cfg.session.done_count,
+                history_cursor=history_cursor,
+                history_len=history_len,
+                history_key=history_key,
+            )
+            cfg.session.snapshot_cache = (now, snapshot)
+        return snapshot
 
     def _render_study(
         *,
         snapshot: StudySnapshot,
         revealed: bool = False,
         revealed_card: Card | None = None,
-        rating_previews: dict[Rating, str] | None = None,
+        rating_previews: Mapping[Rating, str] | None = None,
         mode: StudyMode = "study",
     ):
         htmx = _is_htmx_request()
@@ -195,28 +319,46 @@ def create_app(
         can_go_next = snapshot.history_cursor > 0
         can_undo = snapshot.history_len > 0
 
-        template = "study_pane.html" if htmx else "study.html"
-        return render_template(
-            template,
-            htmx=htmx,
-            due_count=snapshot.selection.due_count,
-            new_count=snapshot.selection.new_count,
-            done_count=snapshot.done_count,
-            card=card,
-            revealed=revealed,
-            next_due_str=next_due_str,
-            rating_previews=rating_previews,
-            mode=mode,
-            history_cursor=snapshot.history_cursor,
-            history_len=snapshot.history_len,
-            can_go_back=can_go_back,
-            can_go_next=can_go_next,
-            can_undo=can_undo,
-        )
+        # Render the compiled template directly; `render_template` would look it up
+        # through the app's loader on every call.
+        context: dict[str, Any] = {
+            "htmx": htmx,
+            "due_count": snapshot.selection.due_count,
+            "new_count": snapshot.selection.new_count,
+            "done_count": snapshot.done_count,
+            "card": card,
+            "revealed": revealed,
+            "next_due_str": next_due_str,
+            "rating_previews": rating_previews,
+            "mode": mode,
+            "history_cursor": snapshot.history_cursor,
+            "history_len": snapshot.history_len,
+            "can_go_back": can_go_back,
+            "can_go_next": can_go_next,
+            "can_undo": can_undo,
+        }
+        app.update_template_context(context)
+        return (pane_template if htmx else study_template).render(context)
+
+    def _render_idle_pane(*, snapshot: StudySnapshot) -> str:
+        """Render the live study pane for an htmx request that changed nothing.
+
+        Repeated no-ops (e.g. a stale reveal button) reuse the previous HTML while
+        the snapshot it was rendered from is unchanged.
+        """
+        script_root = request.script_root
+        cached = cfg.session.idle_pane_cache
+        if cached is not None and cached[0] == snapshot and cached[1] == script_root:
+            return cached[2]
+        html = _render_study(snapshot=snapshot, revealed=False, mode="study")
+        cfg.session.idle_pane_cache = (snapshot, script_root, html)
+        return html
 
     def _render_history_view(*, now: int, snapshot: StudySnapshot) -> str:
         """Render the current history card, or fall back to the live study view."""
-        history_card = _history_card_for_cursor(history_cursor=snapshot.history_cursor)
+        # The snapshot already carries the entry's key; no second lock needed.
+        key = snapshot.history_key
+        history_card = None if key is None else cfg.card(key)
         if history_card is None:
             _reset_history_cursor()
             snapshot = _snapshot(now=now)
@@ -229,7 +371,7 @@ def create_app(
             mode="history",
         )
 
-    @app.get("/")
+    @app.get(_STUDY_PATH)
     def study() -> str:
         now = cfg.now_fn()
         _reset_history_cursor()
@@ -241,17 +383,17 @@ def create_app(
         htmx = _is_htmx_request()
         now = cfg.now_fn()
         card_key = request.form.get("card_key", "")
-        card = cfg.cards_by_key.get(card_key)
+        card = cfg.card(card_key)
 
         _reset_history_cursor()
         snapshot = _snapshot(now=now)
         if card is None:
             if htmx:
-                return _render_study(snapshot=snapshot, revealed=False, mode="study")
-            return redirect(url_for("study"))
+                return _render_idle_pane(snapshot=snapshot)
+            return redirect(request.script_root + _STUDY_PATH)
 
-        with cfg.state_lock:
-            existing = cfg.state_store.cards.get(card_key)
+        # `cards` is copy-on-write, so reading it needs no lock.
+        existing = cfg.state_store.get(card_key)
 
         return _render_study(
             snapshot=snapshot,
@@ -264,40 +406,42 @@ def create_app(
     @app.post("/rate")
     def rate():
         htmx = _is_htmx_request()
-        card_key = request.form.get("card_key", "")
-        rating = RATINGS.get(request.form.get("rating", ""))
-        if rating is None or card_key not in cfg.cards_by_key:
+        form = request.form
+        card_key = form.get("card_key", "")
+        rating_raw = form.get("rating", "")
+        if rating_raw not in _VALID_RATINGS or card_key not in cfg.key_to_index:
             if not htmx:
-                return redirect(url_for("study"))
+                return redirect(request.script_root + _STUDY_PATH)
 
             now = cfg.now_fn()
             _reset_history_cursor()
             snapshot = _snapshot(now=now)
             return _render_study(snapshot=snapshot, revealed=False, mode="study"), 400
 
+        rating = cast(Rating, rating_raw)
         now = cfg.now_fn()
         with cfg.state_lock:
             cfg.session.history_cursor = 0
-            previous_state = cfg.state_store.cards.get(card_key)
-            cfg.state_store.cards[card_key] = apply_rating(
-                existing=previous_state,
-                rating=rating,
-                now=now,
-            )
-            cfg.session.history.append(
+            previous_state = cfg.state_store.get(card_key)
+            new_state = apply_rating(existing=previous_state, rating=rating, now=now)
+            _commit(card_key, new_state, now=now)
+            history = cfg.session.history
+            history.append(
                 HistoryEntry(
                     card_key=card_key,
                     rating=rating,
                     previous_state=previous_state,
                 )
             )
+            if len(history) > _MAX_HISTORY:
+                del history[0]
             cfg.session.done_count += 1
-            cfg.state_store.save(now=now)
+            cfg.session.snapshot_cache = None
 
         snapshot = _snapshot(now=now)
         if htmx:
             return _render_study(snapshot=snapshot, revealed=False, mode="study")
-        return redirect(url_for("study"))
+        return redirect(request.script_root + _STUDY_PATH)
 
     @app.post("/history/back")
     def history_back() -> str:
@@ -321,26 +465,16 @@ def create_app(
         with cfg.state_lock:
             cfg.session.history_cursor = 0
             entry = cfg.session.history.pop() if cfg.session.history else None
-
-            restored_state: CardState | None
-            if entry is None:
-                restored_state = None
-            elif entry.previous_state is None:
-                cfg.state_store.cards.pop(entry.card_key, None)
-                restored_state = None
-            else:
-                cfg.state_store.cards[entry.card_key] = entry.previous_state
-                restored_state = entry.previous_state
-
             if entry is not None:
+                _commit(entry.card_key, entry.previous_state, now=now)
                 cfg.session.done_count = max(0, cfg.session.done_count - 1)
-                cfg.state_store.save(now=now)
+            cfg.session.snapshot_cache = None
 
         snapshot = _snapshot(now=now)
         if entry is None:
             return _render_study(snapshot=snapshot, revealed=False, mode="study"), 400
 
-        card = cfg.cards_by_key.get(entry.card_key)
+        card = cfg.card(entry.card_key)
         if card is None:
             return _render_study(snapshot=snapshot, revealed=False, mode="study")
 
@@ -348,7 +482,8 @@ def create_app(
             snapshot=snapshot,
             revealed=True,
             revealed_card=card,
-            rating_previews=_rating_previews(existing=restored_state, now=now),
+            # A memoized lookup keyed on the schedule fields (no `apply_rating`).
+            rating_previews=_rating_previews(existing=entry.previous_state, now=now),
             mode="study",
         )
 
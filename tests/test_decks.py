@@ -4,14 +4,16 @@ from pathlib import Path
 
 import pytest
 
-from arnold.decks import DeckValidationError, load_deck
+from arnold.decks import DeckValidationError, legacy_card_keys, load_deck, load_decks
 
 
 def _expected_card_id(front: str, back: str, tags: list[str] | None = None) -> str:
     canonical_tags = sorted(set(tags or []))
-    payload = {"back": back, "front": front, "tags": canonical_tags}
-    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
-    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    raw = b"".join(
+        b"%d:%s" % (len(data), data)
+        for data in (s.encode("utf-8") for s in [front, back, *canonical_tags])
+    )
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
 
 
 def test_load_deck_accepts_object_format(tmp_path: Path) -> None:
@@ -59,6 +61,20 @@ def test_load_deck_accepts_array_format(tmp_path: Path) -> None:
     assert deck.cards[0].card_id == _expected_card_id("front a", "back a")
 
 
+def test_load_deck_reuses_read_buffer_across_sizes(tmp_path: Path) -> None:
+    big = tmp_path / "big.json"
+    big.write_text(
+        json.dumps([{"front": f"front {i}", "back": "back"} for i in range(50)]),
+        encoding="utf-8",
+    )
+    small = tmp_path / "small.json"
+    small.write_text(json.dumps([{"front": "f", "back": "b"}]), encoding="utf-8")
+
+    assert len(load_deck(big, deck_index=0).cards) == 50
+    assert len(load_deck(small, deck_index=1).cards) == 1
+    assert len(load_deck(big, deck_index=0).cards) == 50
+
+
 def test_load_deck_rejects_invalid_json(tmp_path: Path) -> None:
     path = tmp_path / "deck.json"
     path.write_text("{", encoding="utf-8")
@@ -69,6 +85,16 @@ def test_load_deck_rejects_invalid_json(tmp_path: Path) -> None:
     assert "Invalid JSON" in str(excinfo.value)
 
 
+def test_load_deck_reports_invalid_json_position(tmp_path: Path) -> None:
+    path = tmp_path / "deck.json"
+    path.write_text('[\n  {"front": "f", "back": "b"},,\n]', encoding="utf-8")
+
+    with pytest.raises(DeckValidationError) as excinfo:
+        load_deck(path, deck_index=0)
+
+    assert "(line 2, col 31)" in str(excinfo.value)
+
+
 def test_load_deck_rejects_missing_fields(tmp_path: Path) -> None:
     path = tmp_path / "deck.json"
     path.write_text(json.dumps([{"front": "only front"}]), encoding="utf-8")
@@ -116,6 +142,43 @@ def test_load_deck_dedupes_duplicate_cards(tmp_path: Path) -> None:
     assert deck.cards[1].card_id == _expected_card_id("front 2", "back 2")
 
 
+def test_load_deck_card_ids_respect_field_boundaries(tmp_path: Path) -> None:
+    path = tmp_path / "deck.json"
+    path.write_text(
+        json.dumps(
+            [
+                {"front": "ab", "back": "c"},
+                {"front": "a", "back": "bc"},
+                {"front": "a", "back": "b", "tags": ["c"]},
+            ]
+        ),
+        encoding="utf-8",
+    )
+
+    deck = load_deck(path, deck_index=0)
+    assert len({card.card_id for card in deck.cards}) == 3
+
+
+def test_load_deck_rejects_non_string_tags(tmp_path: Path) -> None:
+    path = tmp_path / "deck.json"
+    path.write_text(
+        json.dumps(
+            [
+                {"front": "f1", "back": "b1", "tags": ["ok", 1]},
+                {"front": "f2", "back": "b2", "tags": "ok"},
+                {"front": "f3", "back": "b3", "tags": [["nested"]]},
+            ]
+        ),
+        encoding="utf-8",
+    )
+
+    with pytest.raises(DeckValidationError) as excinfo:
+        load_deck(path, deck_index=0)
+
+    for i in range(3):
+        assert f"Card {i}: field 'tags' must be a list of strings" in str(excinfo.value)
+
+
 def test_load_deck_rejects_non_string_front_back(tmp_path: Path) -> None:
     path = tmp_path / "deck.json"
     path.write_text(json.dumps([{"front": 123, "back": "ok"}]), encoding="utf-8")
@@ -124,3 +187,58 @@ def test_load_deck_rejects_non_string_front_back(tmp_path: Path) -> None:
         load_deck(path, deck_index=0)
 
     assert "field 'front' must be a string" in str(excinfo.value)
+
+
+def test_load_deck_accepts_integers_wider_than_64_bits(tmp_path: Path) -> None:
+    big = 123456789012345678901234567890
+    path = tmp_path / "deck.json"
+    path.write_text(
+        json.dumps([{"front": "a", "back": "b", "x": big}]), encoding="utf-8"
+    )
+    deck = load_deck(path, deck_index=0)
+    assert [c.front for c in deck.cards] == ["a"]
+
+    path.write_text(json.dumps([{"front": big, "back": "b"}]), encoding="utf-8")
+    with pytest.raises(DeckValidationError) as excinfo:
+        load_deck(path, deck_index=0)
+    assert "field 'front' must be a string" in str(excinfo.value)
+
+
+def test_load_decks_keeps_input_order_and_collects_failures(tmp_path: Path) -> None:
+    paths: list[Path] = []
+    for i in range(5):
+        path = tmp_path / f"deck{i}.json"
+        if i == 2:
+            path.write_text("{", encoding="utf-8")
+        else:
+            path.write_text(
+                json.dumps({"name": f"Deck {i}", "cards": [{"front": "f", "back": "b"}]}),
+                encoding="utf-8",
+            )
+        paths.append(path)
+
+    decks, failures = load_decks(paths)
+    assert [d.name for d in decks] == ["Deck 0", "Deck 1", "Deck 3", "Deck 4"]
+    assert [d.cards[0].order for d in decks] == [0, 1 << 32, 3 << 32, 4 << 32]
+    assert [f.path for f in failures] == [paths[2]]
+
+
+def test_legacy_card_keys_maps_sha1_keys_to_current_keys(tmp_path: Path) -> None:
+    path = tmp_path / "deck.json"
+    path.write_text(
+        json.dumps([{"front": "front 1", "back": "back 1", "tags": ["b", "a"]}]),
+        encoding="utf-8",
+    )
+    deck = load_deck(path, deck_index=0)
+    card = deck.cards[0]
+
+    legacy_deck_id = hashlib.sha1(str(path.resolve()).encode("utf-8")).hexdigest()[:12]
+    raw = json.dumps(
+        {"back": "back 1", "front": "front 1", "tags": ["a", "b"]},
+        ensure_ascii=False,
+        separators=(",", ":"),
+        sort_keys=True,
+    )
+    legacy_card_id = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    assert legacy_card_keys([deck]) == {f"{legacy_deck_id}:{legacy_card_id}": card.key}
@@ -1,7 +1,8 @@
+import random
 from pathlib import Path
 
 from arnold.models import Card, CardState, Deck
-from arnold.scheduler import apply_rating, select_next
+from arnold.scheduler import StudyQueue, apply_rating, select_next
 
 
 def test_apply_rating_good_from_new_is_one_day() -> None:
@@ -21,6 +22,16 @@ def test_apply_rating_again_resets_and_is_soon() -> None:
     assert st.due == now + 60
 
 
+def test_apply_rating_hard_and_easy_intervals() -> None:
+    now = 1_700_000_000
+    hard = apply_rating(existing=None, rating="hard", now=now)
+    assert (hard.repetitions, hard.interval_days, hard.ease_factor) == (1, 1.0, 2.35)
+
+    easy = apply_rating(existing=None, rating="easy", now=now)
+    assert (easy.repetitions, easy.interval_days, easy.due) == (1, 2.0, now + 2 * 86_400)
+    assert easy.ease_factor == 2.65
+
+
 def test_select_next_prefers_due_over_new(tmp_path: Path) -> None:
     deck_path = tmp_path / "deck.json"
     cards = (
@@ -32,7 +43,7 @@ def test_select_next_prefers_due_over_new(tmp_path: Path) -> None:
             tags=(),
             deck_name="D",
             deck_path=deck_path,
-            order=(0, 0),
+            order=0,
         ),
         Card(
             deck_id="d",
@@ -42,7 +53,7 @@ def test_select_next_prefers_due_over_new(tmp_path: Path) -> None:
             tags=(),
             deck_name="D",
             deck_path=deck_path,
-            order=(0, 1),
+            order=1,
         ),
     )
     deck = Deck(path=deck_path, deck_id="d", name="D", cards=cards)
@@ -53,7 +64,7 @@ def test_select_next_prefers_due_over_new(tmp_path: Path) -> None:
             due=0, interval_days=1.0, ease_factor=2.5, repetitions=1
         )
     }
-    sel = select_next(decks=[deck], state=state, now=now)
+    sel = select_next(cards=deck.cards, state=state, now=now)
     assert sel.card == cards[1]
     assert sel.due_count == 1
     assert sel.new_count == 1
@@ -69,7 +80,7 @@ def test_select_next_returns_none_when_all_future(tmp_path: Path) -> None:
         tags=(),
         deck_name="D",
         deck_path=deck_path,
-        order=(0, 0),
+        order=0,
     )
     deck = Deck(path=deck_path, deck_id="d", name="D", cards=(card,))
 
@@ -77,6 +88,86 @@ def test_select_next_returns_none_when_all_future(tmp_path: Path) -> None:
     state = {
         card.key: CardState(due=200, interval_days=1.0, ease_factor=2.5, repetitions=1)
     }
-    sel = select_next(decks=[deck], state=state, now=now)
+    sel = select_next(cards=deck.cards, state=state, now=now)
     assert sel.card is None
     assert sel.next_due == 200
+
+
+def test_select_next_orders_due_by_due_then_order(tmp_path: Path) -> None:
+    deck_path = tmp_path / "deck.json"
+    cards = tuple(
+        Card(
+            deck_id="d",
+            card_id=str(i),
+            front=f"f{i}",
+            back=f"b{i}",
+            tags=(),
+            deck_name="D",
+            deck_path=deck_path,
+            order=i,
+        )
+        for i in range(4)
+    )
+    deck = Deck(path=deck_path, deck_id="d", name="D", cards=cards)
+
+    now = 100
+    state = {
+        cards[i].key: CardState(
+            due=due, interval_days=1.0, ease_factor=2.5, repetitions=1
+        )
+        for i, due in ((0, 50), (1, 10), (3, 10))
+    }
+    sel = select_next(cards=deck.cards, state=state, now=now)
+    assert sel.card == cards[1]
+    assert sel.due_count == 3
+    assert sel.new_count == 1
+    assert sel.total_count == 4
+    assert sel.next_due is None
+
+
+def test_study_queue_matches_select_next(tmp_path: Path) -> None:
+    rng = random.Random(1234)
+    decks = []
+    for deck_index in range(3):
+        deck_path = tmp_path / f"deck{deck_index}.json"
+        cards = tuple(
+            Card(
+                deck_id=f"d{deck_index}",
+                card_id=str(i),
+                front=f"f{i}",
+                back=f"b{i}",
+                tags=(),
+                deck_name="D",
+                deck_path=deck_path,
+                order=(deck_index << 32) | i,
+            )
+            for i in range(20)
+        )
+        decks.append(Deck(path=deck_path, deck_id=f"d{deck_index}", name="D", cards=cards))
+    all_cards = [card for deck in decks for card in deck.cards]
+    keys = [card.key for card in all_cards]
+
+    state: dict[str, CardState] = {}
+    for key in rng.sample(keys, 15):
+        state[key] = CardState(
+            due=rng.randrange(0, 500), interval_days=1.0, ease_factor=2.5, repetitions=1
+        )
+
+    queue = StudyQueue(cards=all_cards, state=state)
+    for step in range(500):
+        now = rng.randrange(0, 500)
+        assert queue.select(now=now) == select_next(cards=all_cards, state=state, now=now)
+
+        key = rng.choice(keys)
+        if step % 7 == 0:
+            state.pop(key, None)
+            queue.update(key, None)
+        else:
+            new_state = CardState(
+                due=rng.randrange(0, 500),
+                interval_days=1.0,
+                ease_factor=2.5,
+                repetitions=1,
+            )
+            state[key] = new_state
+            queue.update(key, new_state)
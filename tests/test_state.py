@@ -1,10 +1,12 @@
 import json
+import sys
 from pathlib import Path
+from typing import Any, Self
 
 import pytest
 
 from arnold.models import CardState
-from arnold.state import StateFileError, StateStore
+from arnold.state import StateFileError, StateStore, StateWriter
 
 
 def test_state_store_save_and_load_round_trip(tmp_path: Path) -> None:
@@ -27,6 +29,36 @@ def test_state_store_save_and_load_round_trip(tmp_path: Path) -> None:
     )
 
 
+def test_state_store_saves_cards_passed_in_or_set_directly(tmp_path: Path) -> None:
+    path = tmp_path / "state.json"
+    first = CardState(due=1, interval_days=1.0, ease_factor=2.5, repetitions=1)
+    second = CardState(due=2, interval_days=2.0, ease_factor=2.6, repetitions=2)
+
+    store = StateStore(path=path, cards={"deck:a": first})
+    store.save(now=1)
+    assert StateStore.load(path).cards == {"deck:a": first}
+
+    store.cards["deck:a"] = second
+    store.cards["deck:b"] = first
+    store.save(now=2)
+    assert StateStore.load(path).cards == {"deck:a": second, "deck:b": first}
+
+
+def test_state_store_interns_loaded_keys(tmp_path: Path) -> None:
+    store = StateStore.load(tmp_path / "state.json")
+    state = CardState(due=1, interval_days=1.0, ease_factor=2.5, repetitions=1)
+    store.set("deck:saved", state)
+    store.save(now=1)
+    store.commit("deck:logged", state, now=2)
+
+    reloaded = StateStore.load(store.path)
+    # Same objects as `Card.key`, so lookups hit the identity fast path.
+    assert {id(k) for k in reloaded.cards} == {
+        id(sys.intern("deck:saved")),
+        id(sys.intern("deck:logged")),
+    }
+
+
 def test_state_store_rejects_invalid_json(tmp_path: Path) -> None:
     path = tmp_path / "state.json"
     path.write_text("{", encoding="utf-8")
@@ -57,3 +89,224 @@ def test_state_store_accepts_legacy_flat_mapping(tmp_path: Path) -> None:
     assert store.get("deck:card") == CardState(
         due=1, interval_days=0.0, ease_factor=2.5, repetitions=0
     )
+
+
+def test_state_store_renames_legacy_keys(tmp_path: Path) -> None:
+    store = StateStore.load(tmp_path / "state.json")
+    legacy_key = "d" * 12 + ":" + "a" * 40
+    other_legacy_key = "d" * 12 + ":" + "b" * 40
+    state = CardState(due=5, interval_days=1.0, ease_factor=2.5, repetitions=1)
+    store.set(legacy_key, state)
+    store.set(other_legacy_key, state)
+    assert store.has_legacy_keys()
+
+    moved = store.rename_keys({legacy_key: "e" * 12 + ":" + "c" * 16})
+    assert moved == 1
+    assert store.get("e" * 12 + ":" + "c" * 16) == state
+    assert store.get(legacy_key) is None
+    # Cards from decks that were not loaded keep their legacy key until they are.
+    assert store.get(other_legacy_key) == state
+    assert store.has_legacy_keys()
+
+    store.save(now=6)
+    assert StateStore.load(store.path).cards == store.cards
+
+
+def test_state_store_commit_logs_changes_and_replays_them(tmp_path: Path) -> None:
+    path = tmp_path / "state.json"
+    store = StateStore.load(path)
+    first = CardState(due=1, interval_days=1.0, ease_factor=2.5, repetitions=1)
+    second = CardState(due=2, interval_days=6.0, ease_factor=2.5, repetitions=2)
+
+    store.commit("deck:a", first, now=10)
+    store.commit("deck:b", first, now=11)
+    store.commit("deck:a", second, now=12)
+    store.commit("deck:b", None, now=13)
+
+    assert not path.exists()
+    assert store.log_path.exists()
+
+    reloaded = StateStore.load(path)
+    assert reloaded.cards == {"deck:a": second}
+
+
+def test_state_store_checkpoints_and_truncates_log(tmp_path: Path) -> None:
+    path = tmp_path / "state.json"
+    store = StateStore.load(path)
+    store.checkpoint_every = 2
+    state = CardState(due=1, interval_days=1.0, ease_factor=2.5, repetitions=1)
+
+    store.commit("deck:a", state, now=10)
+    assert store.log_path.exists()
+    store.commit("deck:b", state, now=11)
+    assert path.exists()
+    assert not store.log_path.exists()
+
+    store.commit("deck:c", state, now=12)
+    store.checkpoint(now=13)
+    assert not store.log_path.exists()
+    assert set(StateStore.load(path).cards) == {"deck:a", "deck:b", "deck:c"}
+
+
+def test_state_store_recovers_from_torn_final_log_line(tmp_path: Path) -> None:
+    path = tmp_path / "state.json"
+    store = StateStore.load(path)
+    state = CardState(due=1, interval_days=1.0, ease_factor=2.5, repetitions=1)
+    store.commit("deck:a", state, now=10)
+    with store.log_path.open("a", encoding="utf-8") as f:
+        f.write('{"k":"deck:b","s":{"du')
+
+    recovered = StateStore.load(path)
+    assert recovered.cards == {"deck:a": state}
+
+    # The torn fragment is gone, so later appends replay cleanly.
+    recovered.commit("deck:c", state, now=11)
+    recovered.commit("deck:d", state, now=12)
+    assert set(StateStore.load(path).cards) == {"deck:a", "deck:c", "deck:d"}
+
+
+def test_state_store_terminates_unfinished_last_log_line(tmp_path: Path) -> None:
+    path = tmp_path / "state.json"
+    store = StateStore.load(path)
+    state = CardState(due=1, interval_days=1.0, ease_factor=2.5, repetitions=1)
+    store.commit("deck:a", state, now=10)
+    # Crash right before the newline: the record itself is complete.
+    with store.log_path.open("a", encoding="utf-8") as f:
+        f.write(json.dumps({"k": "deck:b", "s": None, "t": 11}))
+
+    recovered = StateStore.load(path)
+    recovered.commit("deck:c", state, now=12)
+    assert set(StateStore.load(path).cards) == {"deck:a", "deck:c"}
+
+
+def test_state_store_rejects_corrupt_log_line_before_the_end(tmp_path: Path) -> None:
+    path = tmp_path / "state.json"
+    store = StateStore.load(path)
+    state = CardState(due=1, interval_days=1.0, ease_factor=2.5, repetitions=1)
+    store.commit("deck:a", state, now=10)
+    with store.log_path.open("a", encoding="utf-8") as f:
+        f.write("not json\n")
+    store.commit("deck:c", state, now=11)
+
+    with pytest.raises(StateFileError) as excinfo:
+        StateStore.load(path)
+    assert "Invalid log entry (line 2)" in str(excinfo.value)
+
+
+def test_state_writer_applies_in_memory_and_flushes_on_close(tmp_path: Path) -> None:
+    path = tmp_path / "state.json"
+    store = StateStore.load(path)
+    writer = StateWriter(store)
+    state = CardState(due=1, interval_days=1.0, ease_factor=2.5, repetitions=1)
+
+    for i in range(10):
+        writer.commit(f"deck:{i}", state, now=10 + i)
+    writer.commit("deck:3", None, now=20)
+    assert "deck:0" in store.cards
+    assert "deck:3" not in store.cards
+
+    writer.close(now=21)
+    assert not store.log_path.exists()
+    reloaded = StateStore.load(path)
+    assert set(reloaded.cards) == {f"deck:{i}" for i in range(10) if i != 3}
+
+
+def test_state_writer_coalesces_changes_within_flush_interval(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    batches: list[int] = []
+    append_log = StateStore.append_log
+
+    def recording_append_log(self: StateStore, changes: list) -> None:
+        batches.append(len(changes))
+        append_log(self, changes)
+
+    monkeypatch.setattr(StateStore, "append_log", recording_append_log)
+    store = StateStore.load(tmp_path / "state.json")
+    writer = StateWriter(store, flush_interval=60.0)
+    state = CardState(due=1, interval_days=1.0, ease_factor=2.5, repetitions=1)
+
+    for i in range(5):
+        writer.commit(f"deck:{i}", state, now=10 + i)
+    writer.close(now=20)
+
+    # Close cuts the window short; everything lands in one write.
+    assert batches == [5]
+    assert len(StateStore.load(store.path).cards) == 5
+
+
+def test_state_writer_saves_changes_whose_log_append_failed(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path_open = Path.open
+
+    def failing_append(self: Path, mode: str = "r", *args: Any, **kwargs: Any) -> Any:
+        if mode == "ab":
+            raise OSError("disk full")
+        return path_open(self, mode, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "open", failing_append)
+    store = StateStore.load(tmp_path / "state.json")
+    writer = StateWriter(store, flush_interval=0.0)
+    state = CardState(due=1, interval_days=1.0, ease_factor=2.5, repetitions=1)
+
+    writer.commit("deck:a", state, now=10)
+    writer.close(now=11)
+
+    monkeypatch.undo()
+    assert StateStore.load(store.path).cards == {"deck:a": state}
+
+
+class _ShortWrite:
+    """Log file stand-in whose first write lands only partly, then fails."""
+
+    def __init__(self, f: Any) -> None:
+        self._f = f
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self._f.close()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._f, name)
+
+    def write(self, data: Any) -> int:
+        self._f.write(bytes(data[:10]))
+        raise OSError(28, "No space left on device")
+
+
+def test_state_store_rolls_back_partial_log_append(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path_open = Path.open
+    failures = [1]
+
+    def short_first_append(self: Path, mode: str = "r", *args: Any, **kwargs: Any) -> Any:
+        f = path_open(self, mode, *args, **kwargs)
+        if mode == "ab" and failures:
+            failures.pop()
+            return _ShortWrite(f)
+        return f
+
+    store = StateStore.load(tmp_path / "state.json")
+    state = CardState(due=1, interval_days=1.0, ease_factor=2.5, repetitions=1)
+    store.commit("deck:a", state, now=10)
+
+    monkeypatch.setattr(Path, "open", short_first_append)
+    with pytest.raises(OSError):
+        store.commit("deck:b", state, now=11)
+    store.commit("deck:c", state, now=12)
+    store.commit("deck:d", state, now=13)
+    monkeypatch.undo()
+
+    # "deck:b" never reached the log (it's saved by the next checkpoint instead).
+    assert set(StateStore.load(store.path).cards) == {"deck:a", "deck:c", "deck:d"}
+    store.checkpoint(now=14)
+    assert set(StateStore.load(store.path).cards) == {
+        "deck:a",
+        "deck:b",
+        "deck:c",
+        "deck:d",
+    }
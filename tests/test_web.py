@@ -2,9 +2,12 @@ from __future__ import annotations
 
 from pathlib import Path
 
-from arnold.models import Card, Deck
+import pytest
+
+from arnold.models import Card, CardState, Deck
+from arnold.scheduler import select_next
 from arnold.state import StateStore
-from arnold.web import create_app
+from arnold.web import _format_sleep_seconds, _rating_previews, create_app
 
 
 def _make_app(tmp_path: Path):
@@ -17,7 +20,7 @@ def _make_app(tmp_path: Path):
         tags=(),
         deck_name="Deck",
         deck_path=deck_path,
-        order=(0, 0),
+        order=0,
     )
     deck = Deck(path=deck_path, deck_id="d", name="Deck", cards=(card,))
     store = StateStore.load(tmp_path / "state.json")
@@ -51,6 +54,7 @@ def test_hotkeys_render_and_history_undo_flow(tmp_path: Path) -> None:
     assert resp.status_code == 200
     assert b"Done 1" in resp.data
     assert card.key in store.cards
+    assert card.key in StateStore.load(store.path).cards
 
     resp = client.post("/history/back", headers=headers)
     assert resp.status_code == 200
@@ -61,10 +65,155 @@ def test_hotkeys_render_and_history_undo_flow(tmp_path: Path) -> None:
     resp = client.post("/history/next", headers=headers)
     assert resp.status_code == 200
     assert b"No cards available" in resp.data
+    assert b"New 0" in resp.data
 
     resp = client.post("/undo", headers=headers)
     assert resp.status_code == 200
     assert b"Done 0" in resp.data
+    assert b"New 1" in resp.data
     assert b"Oops" in resp.data
     assert card.key not in store.cards
+    assert card.key not in StateStore.load(store.path).cards
+
+
+def test_study_view_matches_select_next_across_rate_and_undo(tmp_path: Path) -> None:
+    deck_path = tmp_path / "deck.json"
+    cards = tuple(
+        Card(
+            deck_id="d",
+            card_id=f"c{i}",
+            front=f"front {i}",
+            back=f"back {i}",
+            tags=(),
+            deck_name="Deck",
+            deck_path=deck_path,
+            order=i,
+        )
+        for i in range(3)
+    )
+    deck = Deck(path=deck_path, deck_id="d", name="Deck", cards=cards)
+    store = StateStore.load(tmp_path / "state.json")
+    clock = [1000]
+    app = create_app(decks=[deck], state_store=store, now_fn=lambda: clock[0])
+    client = app.test_client()
+    headers = {"HX-Request": "true"}
+
+    def expect_next() -> Card:
+        card = select_next(cards=cards, state=store.cards, now=clock[0]).card
+        assert card is not None
+        assert card.front in client.get("/").text
+        return card
+
+    for rating in ("again", "good", "again", "easy"):
+        card = expect_next()
+        client.post("/rate", data={"card_key": card.key, "rating": rating}, headers=headers)
+        clock[0] += 120
+
+    client.post("/undo", headers=headers)
+    expect_next()
+
+
+def test_non_htmx_posts_redirect_to_study_view(tmp_path: Path) -> None:
+    app, card, _store = _make_app(tmp_path)
+    client = app.test_client()
+
+    resp = client.post("/rate", data={"card_key": card.key, "rating": "good"})
+    assert resp.status_code == 302
+    assert resp.headers["Location"] == "/"
+
+    resp = client.post(
+        "/reveal",
+        data={"card_key": "missing"},
+        environ_overrides={"SCRIPT_NAME": "/arnold"},
+    )
+    assert resp.status_code == 302
+    assert resp.headers["Location"] == "/arnold/"
+
+
+def test_history_is_bounded(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("arnold.web._MAX_HISTORY", 2)
+    app, card, _store = _make_app(tmp_path)
+    client = app.test_client()
+    headers = {"HX-Request": "true"}
+
+    for _ in range(3):
+        client.post("/rate", data={"card_key": card.key, "rating": "good"}, headers=headers)
+
+    assert client.post("/undo", headers=headers).status_code == 200
+    assert client.post("/undo", headers=headers).status_code == 200
+    assert client.post("/undo", headers=headers).status_code == 400
+
+
+def test_invalid_reveal_reuses_render_until_state_changes(tmp_path: Path) -> None:
+    app, card, _store = _make_app(tmp_path)
+    client = app.test_client()
+    headers = {"HX-Request": "true"}
+
+    first = client.post("/reveal", data={"card_key": "missing"}, headers=headers)
+    again = client.post("/reveal", data={"card_key": "missing"}, headers=headers)
+    assert first.status_code == again.status_code == 200
+    assert first.data == again.data
+    assert b"Done 0" in first.data
+
+    client.post("/rate", data={"card_key": card.key, "rating": "good"}, headers=headers)
+    resp = client.post("/reveal", data={"card_key": "missing"}, headers=headers)
+    assert b"Done 1" in resp.data
+
+
+def test_templates_are_precompiled_without_auto_reload(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    app, _card, _store = _make_app(tmp_path)
+    assert app.jinja_env.auto_reload is False
+
+    def no_source(*_args: object) -> None:
+        raise AssertionError("template should come from the cache")
+
+    # Compiled in create_app, so rendering never goes back to the loader.
+    monkeypatch.setattr(app.jinja_env.loader, "get_source", no_source)
+    resp = app.test_client().get("/")
+    assert resp.status_code == 200
+
+
+def test_rating_previews_depend_only_on_schedule_fields() -> None:
+    assert _rating_previews(existing=None, now=1000) == {
+        "again": "1m",
+        "hard": "1d",
+        "good": "1d",
+        "easy": "2d",
+    }
+
+    state = CardState(due=5, interval_days=6.0, ease_factor=2.5, repetitions=2)
+    later = CardState(due=9_999, interval_days=6.0, ease_factor=2.5, repetitions=2)
+    previews = _rating_previews(existing=state, now=1000)
+    assert previews == _rating_previews(existing=later, now=5_000_000)
+    assert previews == {"again": "1m", "hard": "7.2d", "good": "15d", "easy": "21d"}
+    # Same cached mapping for any card with these fields, at any time.
+    assert previews is _rating_previews(existing=later, now=5_000_000)
+
 
+@pytest.mark.parametrize(
+    ("seconds", "label"),
+    [
+        (-5, "1m"),
+        (89, "1m"),
+        (90, "2m"),
+        (150, "2m"),
+        (3599, "60m"),
+        (3600, "1h"),
+        (5400, "2h"),
+        (86_399, "24h"),
+        (86_400, "1d"),
+        (90_000, "1d"),
+        (90_720, "1.1d"),
+        (99_360, "1.2d"),
+        (168_480, "1.9d"),
+        (95_040, "1.1d"),
+        (622_080, "7.2d"),
+        (864_000, "10d"),
+        (1_296_000, "15d"),
+        (1_339_200, "16d"),
+    ],
+)
+def test_format_sleep_seconds(seconds: int, label: str) -> None:
+    assert _format_sleep_seconds(seconds) == label